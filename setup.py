@@ -65,7 +65,7 @@ setup(
     ],
     install_requires=[
         'click>=2.0',
-        'six>=1.0'
+        'six>=1.6.0'
     ],
     extras_require={
         # eg:
@@ -1,7 +1,10 @@
 """ Definitions for Grammar """
 import logging
 
-from .segments_base import BaseSegment, verbosity_logger, check_still_complete
+import six
+
+from .segments_base import (BaseSegment, verbosity_logger, verbosity_enabled,
+                            check_still_complete)
 from .segments_common import KeywordSegment
 from .match import MatchResult, join_segments_raw_curtailed
 from ..errors import SQLParseError
@@ -43,13 +46,17 @@ class BaseGrammar(object):
 
     def _match(self, segments, match_depth=0, parse_depth=0, verbosity=0):
         """ A wrapper on the match function to do some basic validation """
-        t0 = get_time()
-        # Work out the raw representation and curtail if long
-        verbosity_logger(
-            "[PD:{0} MD:{1}] {2}._match IN [ls={3}, seg={4!r}]".format(
-                parse_depth, match_depth, self.__class__.__name__, len(segments),
-                join_segments_raw_curtailed(segments)),
-            verbosity)
+        # Only do the logging (and timing) if it's going to be shown, because
+        # working out the raw of the segments is expensive.
+        log_match = verbosity_enabled(verbosity)
+        if log_match:
+            t0 = get_time()
+            # Work out the raw representation and curtail if long
+            verbosity_logger(
+                "[PD:{0} MD:{1}] {2}._match IN [ls={3}, seg={4!r}]".format(
+                    parse_depth, match_depth, self.__class__.__name__, len(segments),
+                    join_segments_raw_curtailed(segments)),
+                verbosity)
         if isinstance(segments, BaseSegment):
             segments = segments,  # Make into a tuple for compatability
         if not isinstance(segments, tuple):
@@ -64,14 +71,21 @@ class BaseGrammar(object):
             logging.warning(
                 "{0}.match, returned {1} rather than MatchResult".format(
                     self.__class__.__name__, type(m)))
-        dt = get_time() - t0
-        verbosity_logger(
-            "[PD:{0} MD:{1}] {2}._match OUT [dt={3:.3f}, m={4}]".format(parse_depth, match_depth, self.__class__.__name__, dt, m),
-            verbosity)
+        if log_match:
+            dt = get_time() - t0
+            verbosity_logger(
+                "[PD:{0} MD:{1}] {2}._match OUT [dt={3:.3f}, m={4}]".format(parse_depth, match_depth, self.__class__.__name__, dt, m),
+                verbosity)
         # Basic Validation
         check_still_complete(segments, m.matched_segments, m.unmatched_segments)
         return m
 
+    def compile_match(self):
+        """ Return a specialised function which does the same job as `match`
+        for this grammar, or None if this grammar can't be compiled. Segments
+        use this (if available) for their match grammar. """
+        return None
+
     def expected_string(self):
         """ Return a String which is helpful to understand what this grammar expects """
         raise NotImplementedError(
@@ -303,6 +317,7 @@ class GreedyUntil(BaseGrammar):
 
 class Sequence(BaseGrammar):
     """ Match a specific sequence of elements """
+    _compiled_match = None
 
     def match(self, segments, match_depth=0, parse_depth=0, verbosity=0):
         # Rewrite of sequence. We should match FORWARD, this reduced duplication.
@@ -382,6 +397,102 @@ class Sequence(BaseGrammar):
 
             return MatchResult(matched_segments.matched_segments, unmatched_segments)
 
+    @staticmethod
+    def _is_literal(elem):
+        """ Is this element a keyword which matches using just it's template?
+        (i.e. it doesn't have it's own matching or memoization) """
+        return (isinstance(elem, type)
+                and issubclass(elem, KeywordSegment)
+                and not elem.memoize
+                and elem.match.__func__ is KeywordSegment.match.__func__
+                and elem._match.__func__ is BaseSegment._match.__func__)
+
+    def compile_match(self):
+        """ Compile this sequence into a straight line python function.
+
+        Rather than looping over the elements at match time, we write out the
+        matching code for each element in turn, with whether it's optional
+        already worked out. The result behaves exactly like `match` (but
+        skips the logging in the `_match` wrapper, so segments only use it
+        when that logging is off).
+
+        Elements which are simple keywords (i.e. they just compare the raw
+        to a template) get that comparison written out inline too, so we
+        don't call out to them at all.
+
+        Subclasses which override `match` aren't compiled, because the
+        compiled function wouldn't know about the override. """
+        if six.get_unbound_function(type(self).match) is not six.get_unbound_function(Sequence.match):
+            return None
+        if self._compiled_match is not None:
+            return self._compiled_match
+
+        code_only = self.code_only
+        src = [
+            "def compiled_match(segments, match_depth=0, parse_depth=0, verbosity=0):",
+            "    matched = ()",
+            "    unmatched = segments",
+        ]
+        namespace = {
+            'MatchResult': MatchResult,
+            'check_still_complete': check_still_complete
+        }
+        for idx, elem in enumerate(self._elements):
+            namespace['elem_{0}'.format(idx)] = elem
+            src += [
+                "    # Element {0}".format(idx),
+                "    while True:",
+                "        if len(unmatched) == 0:",
+            ]
+            if all([e.is_optional() for e in self._elements[idx:]]):
+                # We can end here if we run out.
+                src.append("            return MatchResult(matched, unmatched)")
+            else:
+                src.append("            return MatchResult.from_unmatched(segments)")
+            if code_only:
+                src += [
+                    "        if not unmatched[0].is_code:",
+                    "            matched += unmatched[0],",
+                    "            unmatched = unmatched[1:]",
+                    "            continue",
+                ]
+            if self._is_literal(elem):
+                # Do the keyword comparison here, see KeywordSegment.match
+                src += [
+                    "        raw = unmatched[0].raw",
+                    "        if elem_{0}._template == {1}:".format(
+                        idx, "raw" if elem._case_sensitive else "raw.upper()"),
+                    "            matched += elem_{0}(raw=raw, pos_marker=unmatched[0].pos_marker),".format(idx),
+                    "            unmatched = unmatched[1:]",
+                    "            break",
+                ]
+            else:
+                src += [
+                    "        m = elem_{0}._match(unmatched, match_depth=match_depth + 1, parse_depth=parse_depth, verbosity=verbosity)".format(idx),
+                    "        if m.has_match():",
+                    "            matched += m.matched_segments",
+                    "            unmatched = m.unmatched_segments",
+                    "            break",
+                ]
+            if elem.is_optional():
+                src.append("        break")
+            else:
+                src.append("        return MatchResult.from_unmatched(segments)")
+        if code_only:
+            # Be greedy with any trailing non-code
+            src += [
+                "    while len(unmatched) > 0 and not unmatched[0].is_code:",
+                "        matched += unmatched[0],",
+                "        unmatched = unmatched[1:]",
+            ]
+        src += [
+            "    check_still_complete(segments, matched, unmatched)",
+            "    return MatchResult(matched, unmatched)",
+        ]
+        six.exec_("\n".join(src), namespace)
+        self._compiled_match = namespace['compiled_match']
+        return self._compiled_match
+
     def expected_string(self):
         return ", ".join([opt.expected_string() for opt in self._elements])
 
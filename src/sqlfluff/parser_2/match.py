@@ -29,6 +29,11 @@ def join_segments_raw_curtailed(segments, length=20):
 
 
 class MatchResult(namedtuple('MatchResult', ['matched_segments', 'unmatched_segments'])):
+    # The possible values of `status`
+    NO_MATCH = 0
+    PARTIAL = 1
+    COMPLETE = 2
+
     def initial_match_pos_marker(self):
         if self.has_match():
             return self.matched_segments[0].pos_marker
@@ -46,6 +51,17 @@ class MatchResult(namedtuple('MatchResult', ['matched_segments', 'unmatched_segm
     def has_match(self):
         return len(self) > 0
 
+    @property
+    def status(self):
+        """ How well did we match? One of NO_MATCH, PARTIAL or COMPLETE.
+        This does the job of `has_match` and `is_complete` in one go. """
+        if len(self.matched_segments) == 0:
+            return self.NO_MATCH
+        elif len(self.unmatched_segments) > 0:
+            return self.PARTIAL
+        else:
+            return self.COMPLETE
+
     def __bool__(self):
         return self.has_match()
 
@@ -14,35 +14,126 @@ These are the fundamental building blocks.
 """
 
 import logging
-from six import StringIO
+from collections import deque
+
+import six
+from six.moves import intern
 
 from .match import MatchResult, curtail_string, join_segments_raw
 
 
-def verbosity_logger(msg, verbosity=0, level='info', v_level=3):
+def verbosity_enabled(verbosity=0, level='info', v_level=3):
+    """ Would a message from `verbosity_logger` with these settings be shown?
+    Use this to avoid building messages which are expensive to make. """
+    return verbosity >= v_level or logging.getLogger().isEnabledFor(
+        getattr(logging, level.upper()))
+
+
+def verbosity_logger(msg, verbosity=0, level='info', v_level=3, args=()):
+    """ If `args` are given, then `msg` is treated as a %-style format string,
+    and will only be formatted if the message is actually going to be shown. """
     if verbosity >= v_level:
-        print(msg)
+        print(msg % args if args else msg)
     else:
-        # Should be mostly equivalent to logging.info(msg)
-        getattr(logging, level)(msg)
+        # Should be mostly equivalent to logging.info(msg, *args)
+        getattr(logging, level)(msg, *args)
 
 
 def frame_msg(msg):
     return "###\n#\n# {0}\n#\n###".format(msg)
 
 
-def check_still_complete(segments_in, matched_segments, unmatched_segments):
-    initial_str = join_segments_raw(segments_in)
-    current_str = join_segments_raw(
-        matched_segments + unmatched_segments
-    )
-    if initial_str != current_str:
-        raise RuntimeError(
-            "Dropped elements in sequence matching! {0!r} != {1!r}".format(
-                initial_str, current_str))
+# The packrat cache for segment matching. Keys are (cls, id(segments), len(segments))
+# and values are (segments, match_result). We keep a reference to the segments
+# so that the id can't be reused while it's still in the cache.
+_match_cache = {}
+_match_cache_size = 4096
+
 
+def _cached_match(cls, segments, match_depth=0, parse_depth=0, verbosity=0):
+    """ Call `cls.match`, reusing the result if we've already matched this class
+    against exactly this tuple of segments during the current parse. """
+    key = (cls, id(segments), len(segments))
+    cached = _match_cache.get(key)
+    if cached is not None and cached[0] is segments:
+        return cached[1]
+    m = cls.match(segments, match_depth=match_depth, parse_depth=parse_depth, verbosity=verbosity)
+    if len(_match_cache) >= _match_cache_size:
+        _match_cache.clear()
+    _match_cache[key] = (segments, m)
+    return m
 
+
+def clear_match_cache():
+    _match_cache.clear()
+
+
+def check_still_complete(segments_in, matched_segments, unmatched_segments):
+    """ Check that we haven't dropped anything during matching. This is a
+    sense check only, so it's skipped entirely when running with `python -O`. """
+    if __debug__:
+        # Most matches only consume the start of the segments they're given, and
+        # pass the rest back untouched. If so, we only need to compare the part
+        # which was consumed. Comparing the tuples short-circuits on identity.
+        k = len(unmatched_segments)
+        if k and segments_in[-k:] == unmatched_segments:
+            initial_str = join_segments_raw(segments_in[:-k])
+            current_str = join_segments_raw(matched_segments)
+        else:
+            initial_str = join_segments_raw(segments_in)
+            current_str = join_segments_raw(matched_segments + unmatched_segments)
+        if initial_str != current_str:
+            raise RuntimeError("Dropped elements in sequence matching! {0!r} != {1!r}".format(initial_str, current_str))
+
+
+def _coerce_segments(segments):
+    """ Turn whatever was passed to BaseSegment into a tuple of segments.
+    This is the general case, see `_coerce_segments_by_type` for the
+    common ones. """
+    if hasattr(segments, 'matched_segments'):
+        # Safely extract segments from a match
+        return segments.matched_segments
+    elif isinstance(segments, tuple):
+        return segments
+    elif isinstance(segments, list):
+        return tuple(segments)
+    else:
+        raise TypeError(
+            "Unexpected type passed to BaseSegment: {0}".format(
+                type(segments)))
+
+
+_coerce_segments_by_type = {
+    tuple: lambda segments: segments,
+    list: tuple,
+    MatchResult: lambda segments: segments.matched_segments
+}
+
+
+class SegmentMetaclass(type):
+    """ The metaclass for all segments. This resolves which grammars to
+    use for matching and parsing once, when each class is created, rather
+    than every time they're looked up. Classes generated using `make` and
+    `as_optional` also pass through here. """
+    def __init__(cls, name, bases, attrs):
+        super(SegmentMetaclass, cls).__init__(name, bases, attrs)
+        cls._resolved_match_grammar = cls.match_grammar or cls.grammar
+        cls._resolved_parse_grammar = cls.parse_grammar or cls.grammar
+        # We can only expand a segment if we've got a grammar to parse it with
+        cls._is_expandable_cls = bool(cls._resolved_parse_grammar)
+        # If the match grammar can be compiled, then use that instead.
+        compiled = None
+        if hasattr(cls._resolved_match_grammar, 'compile_match'):
+            compiled = cls._resolved_match_grammar.compile_match()
+        cls._compiled_match = staticmethod(compiled) if compiled else None
+
+
+@six.add_metaclass(SegmentMetaclass)
 class BaseSegment(object):
+    # We make a lot of segments while parsing, so we use slots to keep
+    # them small. NB: Subclasses should also define __slots__ (even if
+    # it's empty) otherwise they'll get a __dict__ anyway.
+    __slots__ = ('segments', 'pos_marker', '_raw_cache')
     type = 'base'
     parse_grammar = None
     match_grammar = None
@@ -51,7 +142,12 @@ class BaseSegment(object):
     is_whitespace = False
     optional = False  # NB: See the seguence grammar for details
     is_segment = True
+    # Set memoize to True to cache match results for this segment
+    # within a parse. Useful for grammars with lots of backtracking.
+    memoize = False
     _name = None
+    # BaseSegments always have children (see __init__)
+    _is_raw = False
 
     @property
     def name(self):
@@ -59,37 +155,27 @@ class BaseSegment(object):
 
     @property
     def is_expandable(self):
-        if self._parse_grammar():
-            return True
-        else:
-            return False
+        return self._is_expandable_cls
 
     @property
     def is_code(self):
-        return any([seg.is_code for seg in self.segments])
+        return any(seg.is_code for seg in self.segments)
 
     @property
     def is_comment(self):
-        return all([seg.is_comment for seg in self.segments])
+        return all(seg.is_comment for seg in self.segments)
 
     @classmethod
     def is_optional(cls):
         return cls.optional
 
     @classmethod
-    def _match_grammar(self):
-        if self.match_grammar:
-            return self.match_grammar
-        else:
-            return self.grammar
+    def _match_grammar(cls):
+        return cls._resolved_match_grammar
 
     @classmethod
-    def _parse_grammar(self):
-        # return self.parse_grammar
-        if self.parse_grammar:
-            return self.parse_grammar
-        else:
-            return self.grammar
+    def _parse_grammar(cls):
+        return cls._resolved_parse_grammar
 
     def validate_segments(self, text="constructing"):
         # Check elements of segments:
@@ -111,34 +197,20 @@ class BaseSegment(object):
                 "Setting {0} with a zero length segment set. This shouldn't happen.".format(
                     self.__class__))
 
-        if hasattr(segments, 'matched_segments'):
-            # Safely extract segments from a match
-            self.segments = segments.matched_segments
-        elif isinstance(segments, tuple):
-            self.segments = segments
-        elif isinstance(segments, list):
-            self.segments = tuple(segments)
-        else:
-            raise TypeError(
-                "Unexpected type passed to BaseSegment: {0}".format(
-                    type(segments)))
+        # Look up how to handle what we've been passed by type, rather
+        # than working through lots of checks. This is a hot path.
+        self.segments = _coerce_segments_by_type.get(type(segments), _coerce_segments)(segments)
 
         # Check elements of segments:
         self.validate_segments()
+        # The raw is cached on first use, see `_reconstruct`
+        self._raw_cache = None
 
         if pos_marker:
             self.pos_marker = pos_marker
         else:
             # If no pos given, it's the pos of the first segment
-            # Work out if we're dealing with a match result...
-            if hasattr(segments, 'initial_match_pos_marker'):
-                self.pos_marker = segments.initial_match_pos_marker()
-            elif isinstance(segments, (tuple, list)):
-                self.pos_marker = segments[0].pos_marker
-            else:
-                raise TypeError(
-                    "Unexpected type passed to BaseSegment: {0}".format(
-                        type(segments)))
+            self.pos_marker = self.segments[0].pos_marker
 
     @classmethod
     def from_raw(cls, raw):
@@ -149,71 +221,102 @@ class BaseSegment(object):
         True/False for yes or no, an integer allows a certain number of levels """
 
         # We should call the parse grammar on this segment, which calls
-        # the match grammar on all it's children.
+        # the match grammar on all it's children. Then we parse each of those
+        # children in turn.
+
+        # Rather than recursing, we work through the tree using a stack of the
+        # segments still to parse. That way deeply nested sql can't hit the
+        # recursion limit. Segments are parsed in place, so there's nothing
+        # to rebuild once the stack is empty.
+        todo = deque([(self, recurse, parse_depth)])
+        while todo:
+            seg, seg_recurse, seg_parse_depth = todo.pop()
+            if seg is not self and verbosity_enabled(verbosity):
+                parse_depth_msg = "Parse Depth {0}. Expanding: {1}: {2!r}".format(
+                    seg_parse_depth, seg.__class__.__name__,
+                    curtail_string(seg.raw))
+                verbosity_logger(frame_msg(parse_depth_msg), verbosity=verbosity)
+            children = seg._parse_segments(
+                recurse=seg_recurse, parse_depth=seg_parse_depth, verbosity=verbosity)
+            # Add in reverse, so that they get popped (and parsed) in order.
+            todo.extend(reversed(children))
+        return self
+
+    def _parse_segments(self, recurse=True, parse_depth=0, verbosity=0):
+        """ Parse the content of this segment (but not it's children) using
+        the parse grammar. Returns a list of (segment, recurse, parse_depth)
+        tuples for any children which should be parsed next. """
 
         # the parse_depth and recurse kwargs control how deep we will recurse for testing.
+
+        # Cached matches can't be reused between parses, because parsing
+        # mutates the segments which were returned from matching.
+        clear_match_cache()
+
         if not self.segments:
             # This means we're a root segment, just return an unmutated self
-            return self
+            return []
 
         # Get the Parse Grammar
-        g = self._parse_grammar()
+        g = self._resolved_parse_grammar
         if g is None:
-            logging.debug("{0}.parse: no grammar. returning".format(self.__class__.__name__))
-            return self
+            logging.debug("%s.parse: no grammar. returning", self.__class__.__name__)
+            return []
         # Use the Parse Grammar (and the private method)
         # NOTE: No match_depth kwarg, because this is the start of the matching.
         m = g._match(segments=self.segments, parse_depth=parse_depth, verbosity=verbosity)
 
         # Calling unify here, allows the MatchResult class to do all the type checking.
-        try:
-            m = MatchResult.unify(m)
-        except TypeError as err:
-            logging.error(
-                "[PD:{0}] {1}.parse. Error on unifying result of match grammar!".format(
-                    parse_depth, self.__class__.__name__))
-            raise err
+        # (We only need to if it's not a MatchResult already).
+        if not isinstance(m, MatchResult):
+            try:
+                m = MatchResult.unify(m)
+            except TypeError as err:
+                logging.error(
+                    "[PD:{0}] {1}.parse. Error on unifying result of match grammar!".format(
+                        parse_depth, self.__class__.__name__))
+                raise err
 
         # Basic Validation, that we haven't dropped anything.
         check_still_complete(self.segments, m.matched_segments, m.unmatched_segments)
 
-        if m.has_match():
-            if m.is_complete():
-                # Complete match, happy days!
-                self.segments = m.matched_segments
-            else:
-                # Incomplete match.
-                # For now this means the parsing has failed. Lets add the unmatched bit at the
-                # end as something unparsable.
-                # TODO: Do something more intelligent here.
-                self.segments = m.matched_segments + (UnparsableSegment(
-                    segments=m.unmatched_segments, expected="Nothing..."),)
+        status = m.status
+        if status == MatchResult.COMPLETE:
+            # Complete match, happy days!
+            self.segments = m.matched_segments
+        elif status == MatchResult.PARTIAL:
+            # Incomplete match.
+            # For now this means the parsing has failed. Lets add the unmatched bit at the
+            # end as something unparsable.
+            # TODO: Do something more intelligent here.
+            self.segments = m.matched_segments + (UnparsableSegment(
+                segments=m.unmatched_segments, expected="Nothing..."),)
         else:
             # If there's no match at this stage, then it's unparsable. That's
             # a problem at this stage so wrap it in an unparable segment and carry on.
             self.segments = UnparsableSegment(segments=self.segments, expected=g.expected_string()),  # NB: tuple
+        # We've changed the segments, so reset the cached raw
+        self._raw_cache = None
 
         # Validate new segments
         self.validate_segments(text="parsing")
 
         # Recurse if allowed (using the expand method to deal with the expansion)
         logging.debug(
-            "{0}.parse: Done Parse. Plotting Recursion. Recurse={1!r}".format(
-                self.__class__.__name__, recurse))
-        parse_depth_msg = "###\n#\n# Beginning Parse Depth {0}: {1}\n#\n###\nInitial Structure:\n{2}".format(
-            parse_depth + 1, self.__class__.__name__, self.stringify())
+            "%s.parse: Done Parse. Plotting Recursion. Recurse=%r",
+            self.__class__.__name__, recurse)
+        if recurse is True or (isinstance(recurse, int) and recurse > 1):
+            # Only stringify if it's going to be logged, because that's expensive
+            if logging.getLogger().isEnabledFor(logging.DEBUG):
+                logging.debug(
+                    "###\n#\n# Beginning Parse Depth %s: %s\n#\n###\nInitial Structure:\n%s",
+                    parse_depth + 1, self.__class__.__name__, self.stringify())
         if recurse is True:
-            logging.debug(parse_depth_msg)
-            self.segments = self.expand(self.segments, recurse=True, parse_depth=parse_depth + 1, verbosity=verbosity)
+            return self.expand(self.segments, recurse=True, parse_depth=parse_depth + 1, verbosity=verbosity)
         elif isinstance(recurse, int):
             if recurse > 1:
-                logging.debug(parse_depth_msg)
-                self.segments = self.expand(self.segments, recurse=recurse - 1, parse_depth=parse_depth + 1, verbosity=verbosity)
-
-        # Validate new segments
-        self.validate_segments(text="expanding")
-
-        return self
+                return self.expand(self.segments, recurse=recurse - 1, parse_depth=parse_depth + 1, verbosity=verbosity)
+        return []
 
     def __repr__(self):
         return "<{0}: ({1})>".format(
@@ -221,7 +324,11 @@ class BaseSegment(object):
             self.pos_marker)
 
     def _reconstruct(self):
-        return "".join([seg._reconstruct() for seg in self.segments])
+        # Segments don't change once they're constructed, except in `parse`
+        # which resets the cache, so we only need to work this out once.
+        if self._raw_cache is None:
+            self._raw_cache = "".join([seg._reconstruct() for seg in self.segments])
+        return self._raw_cache
 
     @property
     def raw(self):
@@ -240,31 +347,42 @@ class BaseSegment(object):
         else:
             return preface
 
-    @property
-    def _comments(self):
-        return [seg for seg in self.segments if seg.type == 'comment']
-
-    @property
-    def _non_comments(self):
-        return [seg for seg in self.segments if seg.type != 'comment']
+    def _split_comments(self):
+        """ Split the segments into comments and non comments, in one pass """
+        comments = []
+        non_comments = []
+        for seg in self.segments:
+            if seg.type == 'comment':
+                comments.append(seg)
+            else:
+                non_comments.append(seg)
+        return comments, non_comments
 
     def stringify(self, ident=0, tabsize=4, pos_idx=60, raw_idx=80):
-        buff = StringIO()
+        buff = []
+        self._stringify_into(buff, ident=ident, tabsize=tabsize, pos_idx=pos_idx, raw_idx=raw_idx)
+        return "".join(buff)
+
+    def _stringify_into(self, buff, ident=0, tabsize=4, pos_idx=60, raw_idx=80):
+        """ Append the lines of `stringify` to a list. We share one list
+        for the whole tree and join it once at the end. """
         preface = self._preface(ident=ident, tabsize=tabsize, pos_idx=pos_idx, raw_idx=raw_idx)
-        buff.write(preface + '\n')
-        if self.comment_seperate and len(self._comments) > 0:
-            if self._comments:
-                buff.write((' ' * ((ident + 1) * tabsize)) + 'Comments:' + '\n')
-                for seg in self._comments:
-                    buff.write(seg.stringify(ident=ident + 2, tabsize=tabsize, pos_idx=pos_idx, raw_idx=raw_idx))
-            if self._non_comments:
-                buff.write((' ' * ((ident + 1) * tabsize)) + 'Code:' + '\n')
-                for seg in self._non_comments:
-                    buff.write(seg.stringify(ident=ident + 2, tabsize=tabsize, pos_idx=pos_idx, raw_idx=raw_idx))
+        buff.append(preface + '\n')
+        if self.comment_seperate:
+            comments, non_comments = self._split_comments()
+        else:
+            comments, non_comments = [], []
+        if comments:
+            buff.append((' ' * ((ident + 1) * tabsize)) + 'Comments:' + '\n')
+            for seg in comments:
+                seg._stringify_into(buff, ident=ident + 2, tabsize=tabsize, pos_idx=pos_idx, raw_idx=raw_idx)
+            if non_comments:
+                buff.append((' ' * ((ident + 1) * tabsize)) + 'Code:' + '\n')
+                for seg in non_comments:
+                    seg._stringify_into(buff, ident=ident + 2, tabsize=tabsize, pos_idx=pos_idx, raw_idx=raw_idx)
         else:
             for seg in self.segments:
-                buff.write(seg.stringify(ident=ident + 1, tabsize=tabsize, pos_idx=pos_idx, raw_idx=raw_idx))
-        return buff.getvalue()
+                seg._stringify_into(buff, ident=ident + 1, tabsize=tabsize, pos_idx=pos_idx, raw_idx=raw_idx)
 
     @staticmethod
     def segs_to_tuple(segs, **kwargs):
@@ -291,9 +409,15 @@ class BaseSegment(object):
             This raw function can be overridden, or a grammar defined
             on the underlying class.
         """
-        if cls._match_grammar():
-            # Call the private method
-            m = cls._match_grammar()._match(segments=segments, match_depth=match_depth + 1, parse_depth=parse_depth, verbosity=verbosity)
+        g = cls._resolved_match_grammar
+        if g:
+            if cls._compiled_match and not verbosity_enabled(verbosity):
+                # Use the compiled version of the grammar if we have one. It skips
+                # the logging in the grammar's `_match`, so only when that's off.
+                m = cls._compiled_match(segments, match_depth=match_depth + 1, parse_depth=parse_depth, verbosity=verbosity)
+            else:
+                # Call the private method
+                m = g._match(segments=segments, match_depth=match_depth + 1, parse_depth=parse_depth, verbosity=verbosity)
 
             # Calling unify here, allows the MatchResult class to do all the type checking.
             try:
@@ -316,9 +440,10 @@ class BaseSegment(object):
     def _match(cls, segments, match_depth=0, parse_depth=0, verbosity=0):
         """ A wrapper on the match function to do some basic validation and logging """
         verbosity_logger(
-            "[PD:{0} MD:{1}] {2}._match IN [ls={3}]".format(parse_depth, match_depth, cls.__name__, len(segments)),
+            "[PD:%s MD:%s] %s._match IN [ls=%s]",
             verbosity=verbosity,
-            v_level=4)
+            v_level=4,
+            args=(parse_depth, match_depth, cls.__name__, len(segments)))
         if isinstance(segments, BaseSegment):
             segments = segments,  # Make into a tuple for compatability
         if not isinstance(segments, tuple):
@@ -328,60 +453,63 @@ class BaseSegment(object):
             if isinstance(segments, list):
                 # Let's make it a tuple for compatibility
                 segments = tuple(segments)
-        m = cls.match(segments, match_depth=match_depth, parse_depth=parse_depth, verbosity=verbosity)
+        if cls.memoize:
+            m = _cached_match(cls, segments, match_depth=match_depth, parse_depth=parse_depth, verbosity=verbosity)
+        else:
+            m = cls.match(segments, match_depth=match_depth, parse_depth=parse_depth, verbosity=verbosity)
         if not isinstance(m, tuple) and m is not None:
             logging.warning(
                 "{0}.match, returned {1} rather than tuple".format(
                     cls.__name__, type(m)))
         verbosity_logger(
-            "[PD:{0} MD:{1}] {2}._match OUT [m={3}]".format(parse_depth, match_depth, cls.__name__, m),
+            "[PD:%s MD:%s] %s._match OUT [m=%s]",
             verbosity=verbosity,
-            v_level=4)
+            v_level=4,
+            args=(parse_depth, match_depth, cls.__name__, m))
         # Basic Validation
         check_still_complete(segments, m.matched_segments, m.unmatched_segments)
         return m
 
     @staticmethod
     def expand(segments, recurse=True, parse_depth=0, verbosity=0):
-        segs = tuple()
+        """ Work out which of the given segments need parsing. This doesn't
+        parse them itself, but returns a list of (segment, recurse, parse_depth)
+        tuples which the loop in `parse` works through. """
+        todo = []
         for stmt in segments:
             try:
                 if not stmt.is_expandable:
-                    logging.info("[PD:{0}] Skipping expansion of {1}...".format(parse_depth, stmt))
-                    segs += stmt,
+                    logging.info("[PD:%s] Skipping expansion of %s...", parse_depth, stmt)
                     continue
             except Exception as err:
                 # raise ValueError("{0} has no attribute `is_expandable`. This segment appears poorly constructed.".format(stmt))
                 logging.error("{0} has no attribute `is_expandable`. This segment appears poorly constructed.".format(stmt))
                 raise err
-            if not hasattr(stmt, 'parse'):
-                raise ValueError("{0} has no method `parse`. This segment appears poorly constructed.".format(stmt))
-            parse_depth_msg = "Parse Depth {0}. Expanding: {1}: {2!r}".format(
-                parse_depth, stmt.__class__.__name__,
-                curtail_string(stmt.raw))
-            verbosity_logger(frame_msg(parse_depth_msg), verbosity=verbosity)
-            res = stmt.parse(recurse=recurse, parse_depth=parse_depth, verbosity=verbosity)
-            if isinstance(res, BaseSegment):
-                segs += (res,)
-            else:
-                # We might get back an iterable of segments
-                segs += tuple(res)
-        # Basic Validation
-        check_still_complete(segments, segs, tuple())
-        return segs
+            if not hasattr(stmt, '_parse_segments'):
+                raise ValueError("{0} has no method `_parse_segments`. This segment appears poorly constructed.".format(stmt))
+            todo.append((stmt, recurse, parse_depth))
+        return todo
 
     def raw_list(self):
         """ List of raw elements, mostly for testing or searching """
-        buff = []
-        for s in self.segments:
-            buff += s.raw_list()
-        return buff
+        return [seg.raw for seg in self.iter_raw_seg()]
 
     def iter_raw_seg(self):
         """ Iterate raw segments, mostly for searching """
-        for s in self.segments:
-            for seg in s.iter_raw_seg():
-                yield seg
+        # We walk the tree using a stack of iterators, rather than recursing,
+        # so that we don't stack up a generator for every level of the tree.
+        stack = [iter(self.segments)]
+        while stack:
+            for seg in stack[-1]:
+                if seg._is_raw:
+                    yield seg
+                else:
+                    # Go down a level, and come back to this one after.
+                    stack.append(iter(seg.segments))
+                    break
+            else:
+                # We've finished this level
+                stack.pop()
 
     def iter_unparsables(self):
         """ Iterate through any unparsables this segment may contain """
@@ -391,24 +519,27 @@ class BaseSegment(object):
 
     def type_set(self):
         """ A set of the types contained, mostly for testing """
-        typs = set([self.type])
-        for s in self.segments:
-            typs |= s.type_set()
-        return typs
+        # NB: We don't cache this, because parsing a child changes
+        # the types contained in all of it's parents.
+        return frozenset([self.type]).union(
+            *[s.type_set() for s in self.segments])
 
     def __eq__(self, other):
         # Equal if type, content and pos are the same
         # NB: this should also work for RawSegment
-        return ((type(self) == type(other))
-                and (self.raw == other.raw)
-                and (self.pos_marker == other.pos_marker))
+        # NB: We check the cheap things first, and only compare the raw
+        # if we have to, because for big segments that's expensive.
+        return ((type(self) is type(other))
+                and (self.pos_marker == other.pos_marker)
+                and (len(self.segments) == len(other.segments))
+                and (self.raw == other.raw))
 
     def __len__(self):
         """ implement a len method to make everyone's lives easier """
         return 1
 
     def is_raw(self):
-        return len(self.segments) == 0
+        return self._is_raw
 
     @classmethod
     def expected_string(cls):
@@ -426,137 +557,75 @@ class BaseSegment(object):
         classname = "Optional_{0}".format(cls.__name__)
         # This is the magic, we generate a new class! SORCERY
         newclass = type(classname, (cls, ),
-                        dict(optional=True))
+                        dict(optional=True, __slots__=()))
         # Now we return that class in the abstract. NOT INSTANTIATED
         return newclass
 
     def apply_fixes(self, fixes):
         """ Used in applying fixes if we're fixing linting errors.
         If anything changes, this should return a new version of the segment
-        rather than mutating the original. """
+        rather than mutating the original.
+
+        Fixes should be a dict with keys `delete`, `edit` and `create`.
+        `delete` is a list of segments to remove. `edit` and `create` are
+        lists of (anchor, segment) tuples, where the anchor is the segment
+        to replace, or to insert the new segment before. We return the
+        fixed segment, and the fixes which we couldn't find a place for. """
         # We need to have fixes to apply AND this must have children. In the case
         # of raw segments, they will be replaced or removed by their parent and
         # so this function should just return self.
         if fixes and not self.is_raw():
-            # Get a reference to self to start with, but this will rapidly
-            # become a working copy.
-            r = self
-
-            # First mutate self if required. Then recurse. Then create.
-
-            # First remove stuff (because that's easy)
-            if 'delete' in fixes:
-                # Make a working copy
-                seg_buffer = []
-                todo_buffer = list(self.segments)
-                while True:
-                    if len(todo_buffer) == 0:
-                        break
-                    else:
-                        seg = todo_buffer.pop(0)
-                        # We do still need to check for whether the delete key is there
-                        # because we might have removed it during this cycle
-                        if 'delete' in fixes and seg in fixes['delete']:
-                            # If its' the the delete buffer, then skip it from assembling the
-                            # sequence, but also remove if from the delete buffer
-                            fixes['delete'].remove(seg)
-                            # If we've removed the last one, remove the delete key
-                            if len(fixes['delete']) == 0:
-                                del fixes['delete']
-                        else:
-                            # We don't want to remove this one so add it to the buffer
-                            seg_buffer.append(seg)
-                # Make the buffer into a tuple
-                seg_buffer = tuple(seg_buffer)
-                # Do we need to reform?
-                if seg_buffer != r.segments:
-                    r = r.__class__(
-                        segments=seg_buffer,
-                        pos_marker=r.pos_marker
-                    )
-
-            # Then edit stuff
-            if 'edit' in fixes:
-                # Make a working copy
-                q = fixes['edit']
-                for anchor, edit in q:
-                    for s in r.segments:
-                        if anchor == s:
-                            # We've found the segment to delete.
-                            # Copy the working segment, with everything except
-                            # this item
-
-                            # TODO: Redo this so we don't use index matcing!!!!
-
-                            seg_buffer = []
-                            for seg in r.segments:
-                                if seg == anchor:
-                                    seg_buffer.append(edit)
-                                else:
-                                    seg_buffer.append(seg)
-                            r = r.__class__(
-                                segments=tuple(seg_buffer),
-                                pos_marker=r.pos_marker
-                            )
-                            # Given we've dealt with this item, remove it from the pending fixes
-                            fixes['edit'].remove((anchor, edit))
-                            # If we've removed the last one, remove the edit key
-                            if len(fixes['edit']) == 0:
-                                del fixes['edit']
-                            # break out of the r.segments iteration, so we can reform on the
-                            # new working version.
-                            break
-
-            # Then recurse (i.e. deal with the children)
-            seg_buffer = []
-            seg_queue = r.segments
-            for seg in seg_queue:
-                s, fixes = seg.apply_fixes(fixes)
-                seg_buffer.append(s)
-            r = r.__class__(
-                segments=tuple(seg_buffer),
-                pos_marker=r.pos_marker
-            )
-
-            # Finally create new things (we don't recurse on these, because that
-            # makes no sense).
-            # Then edit stuff
-            if 'create' in fixes:
-                # Make a working copy
-                q = fixes['create']
-                for c in q:
-                    pre_buffer = []
-                    post_buffer = r.segments
-                    while True:
-                        if len(post_buffer) == 0:
-                            # We've run out of segments without finding the fix, it's not here...
-                            break
-                        elif post_buffer[0].pos_marker == c.pos_marker:
-                            # This is the position of this fix! Insert it in.
-                            # There will already be a segment in this position, so we
-                            # insert the fix in BEFORE that one, and then realign.
-                            r = r.__class__(
-                                segments=tuple(pre_buffer + [c] + post_buffer),
-                                pos_marker=r.pos_marker
-                            )
-                            # Given we've dealt with this item, remove it from the pending fixes
-                            fixes['create'].remove(c)
-                            # If we've removed the last one, remove the create key
-                            if len(fixes['create']) == 0:
-                                del fixes['create']
-                            # break out of the r.segments iteration, so we can reform on the
-                            # new working version.
-                            break
-                        else:
-                            # Move on
-                            pre_buffer.append(post_buffer.pop(0))
+            # Work out the lookups once for the whole tree. We find segments
+            # by id rather than by equality, because equality means comparing
+            # the raw, and the fixes refer to segments in this tree anyway.
+            todo = {
+                'delete': set([id(seg) for seg in fixes.get('delete', [])]),
+                'edit': dict([(id(anchor), edit) for anchor, edit in fixes.get('edit', [])]),
+                'create': dict([(id(anchor), new) for anchor, new in fixes.get('create', [])])
+            }
+            r = self._apply_fixes(todo)
+
+            # Anything still in todo wasn't found, so pass it back.
+            remaining = {}
+            if todo['delete']:
+                remaining['delete'] = [seg for seg in fixes['delete'] if id(seg) in todo['delete']]
+            for key in ['edit', 'create']:
+                if todo[key]:
+                    remaining[key] = [f for f in fixes[key] if id(f[0]) in todo[key]]
 
             # Lastly, before returning, we should realign positions.
             # Note: Realign also returns a copy
-            return r.realign(), fixes
+            return r.realign(), remaining
         else:
             return self, fixes
 
+    def _apply_fixes(self, todo):
+        """ Apply the fixes in `todo` to this segment and it's children, in a
+        single pass, and rebuild it once at the end. Fixes are removed from
+        `todo` as they're applied. See `apply_fixes`. """
+        seg_buffer = []
+        for seg in self.segments:
+            seg_id = id(seg)
+            # First remove stuff (because that's easy)
+            if seg_id in todo['delete']:
+                todo['delete'].remove(seg_id)
+                continue
+            # Then edit stuff
+            if seg_id in todo['edit']:
+                seg = todo['edit'].pop(seg_id)
+            # Then recurse (i.e. deal with the children), if there's anything left to do
+            if not seg.is_raw() and (todo['delete'] or todo['edit'] or todo['create']):
+                seg = seg._apply_fixes(todo)
+            # Finally create new things, before the anchor. (We don't recurse
+            # on these, because that makes no sense).
+            if seg_id in todo['create']:
+                seg_buffer.append(todo['create'].pop(seg_id))
+            seg_buffer.append(seg)
+        return self.__class__(
+            segments=tuple(seg_buffer),
+            pos_marker=self.pos_marker
+        )
+
     def realign(self):
         """ realign returns a copy of this class with the pos_markers realigned,
         this is used mostly during fixes """
@@ -568,7 +637,7 @@ class BaseSegment(object):
         # recurse to realign their children.
 
         seg_buffer = []
-        todo_buffer = list(self.segments)
+        todo_buffer = deque(self.segments)
         running_pos = self.pos_marker
 
         while True:
@@ -577,7 +646,7 @@ class BaseSegment(object):
                 break
             else:
                 # Get the first off the buffer
-                seg = todo_buffer.pop(0)
+                seg = todo_buffer.popleft()
                 # We'll preserve statement indexes so we should keep track of that.
                 # When recreating, we use the DELTA of the index so that's what matter...
                 idx = seg.pos_marker.statement_index - running_pos.statement_index
@@ -616,15 +685,16 @@ class RawSegment(BaseSegment):
     """ This is a segment without any subsegments,
     it could be postprocessed later, but then it would be
     a different class. """
+    __slots__ = ('_raw',)
     type = 'raw'
     _is_code = False
     _is_comment = False
     _template = '<unset>'
     _case_sensitive = False
-
-    @property
-    def is_expandable(self):
-        return False
+    # A Raw segment has no segments, it's empty. This is here
+    # in case we need to iterate.
+    segments = ()
+    _is_raw = True
 
     @property
     def is_code(self):
@@ -635,7 +705,10 @@ class RawSegment(BaseSegment):
         return self._is_comment
 
     def __init__(self, raw, pos_marker):
-        self._raw = raw
+        # Most raw segments are one of a handful of repeated strings (keywords,
+        # whitespace, commas), so we intern them to save memory and make
+        # comparisons cheaper. NB: Only `str` can be interned in python 2.
+        self._raw = intern(raw) if isinstance(raw, str) else raw
         # pos marker is required here
         self.pos_marker = pos_marker
 
@@ -643,17 +716,13 @@ class RawSegment(BaseSegment):
         """ Iterate raw segments, mostly for searching """
         yield self
 
-    @property
-    def segments(self):
-        """ in case we need to iterate """
-        return []
-        # A Raw segments, has no segments, it's empty
-        # raise RuntimeError("Trying to iterate on a RawSegment!")
-        # return [self]
-
     def raw_list(self):
         return [self.raw]
 
+    def type_set(self):
+        """ A set of the types contained, mostly for testing """
+        return frozenset([self.type])
+
     @property
     def raw(self):
         return self._raw
@@ -667,9 +736,9 @@ class RawSegment(BaseSegment):
             self.pos_marker,
             self.raw)
 
-    def stringify(self, ident=0, tabsize=4, pos_idx=60, raw_idx=80):
+    def _stringify_into(self, buff, ident=0, tabsize=4, pos_idx=60, raw_idx=80):
         preface = self._preface(ident=ident, tabsize=tabsize, pos_idx=pos_idx, raw_idx=raw_idx)
-        return preface + '\n'
+        buff.append(preface + '\n')
 
     def _suffix(self):
         return "{0!r}".format(self.raw)
@@ -683,6 +752,8 @@ class RawSegment(BaseSegment):
             _template = template
         else:
             _template = template.upper()
+        if isinstance(_template, str):
+            _template = intern(_template)
         # Use the name if provided otherwise default to the template
         name = name or _template
         # Now lets make the classname (it indicates the mother class for clarity)
@@ -690,16 +761,16 @@ class RawSegment(BaseSegment):
         # This is the magic, we generate a new class! SORCERY
         newclass = type(classname, (cls, ),
                         dict(_template=_template, _case_sensitive=case_sensitive,
-                             _name=name, **kwargs))
+                             _name=name, __slots__=(), **kwargs))
         # Now we return that class in the abstract. NOT INSTANTIATED
         return newclass
 
 
 class UnparsableSegment(BaseSegment):
+    __slots__ = ('_expected',)
     type = 'unparsable'
     # From here down, comments are printed seperately.
     comment_seperate = True
-    _expected = ""
 
     def __init__(self, *args, **kwargs):
         self._expected = kwargs.pop('expected', "")
@@ -24,6 +24,7 @@ class KeywordSegment(RawSegment):
     fly for convenience. The `make` method is defined on RawSegment
     instead of here, but can be used here too. """
 
+    __slots__ = ()
     type = 'keyword'
     _is_code = True
     _template = '<unset>'
@@ -44,13 +45,14 @@ class KeywordSegment(RawSegment):
                 raw_comp = raw
             else:
                 raw_comp = raw.upper()
-            logging.debug("[PD:{0} MD:{1}] (KW) {2}.match considering {3!r} against {4!r}".format(
-                parse_depth, match_depth, cls.__name__, raw_comp, cls._template))
+            logging.debug(
+                "[PD:%s MD:%s] (KW) %s.match considering %r against %r",
+                parse_depth, match_depth, cls.__name__, raw_comp, cls._template)
             if cls._template == raw_comp:
                 m = cls(raw=raw, pos_marker=pos),  # Return as a tuple
                 return MatchResult(m, segments[1:])
         else:
-            logging.debug("{1} will not match sequence of length {0}".format(len(segments), cls.__name__))
+            logging.debug("%s will not match sequence of length %s", cls.__name__, len(segments))
         return MatchResult.from_unmatched(segments)
 
     @classmethod
@@ -61,6 +63,8 @@ class KeywordSegment(RawSegment):
 class ReSegment(KeywordSegment):
     """ A more flexible matching segment for use of regexes
     USE WISELY """
+    __slots__ = ()
+
     @classmethod
     def match(cls, segments, match_depth=0, parse_depth=0, verbosity=0):
         """ ReSegment implements it's own matching function,
@@ -79,8 +83,9 @@ class ReSegment(KeywordSegment):
             sc = s
         if len(s) == 0:
             raise ValueError("Zero length string passed to ReSegment!?")
-        logging.debug("[PD:{0} MD:{1}] (RE) {2}.match considering {3!r} against {4!r}".format(
-            parse_depth, match_depth, cls.__name__, sc, cls._template))
+        logging.debug(
+            "[PD:%s MD:%s] (RE) %s.match considering %r against %r",
+            parse_depth, match_depth, cls.__name__, sc, cls._template)
         # Try the regex
         result = re.match(cls._template, sc)
         if result:
@@ -100,6 +105,8 @@ class NamedSegment(KeywordSegment):
     """ A segment which matches based on the `name` property
     of segments. Useful for matching quoted segments.
     USE WISELY """
+    __slots__ = ()
+
     @classmethod
     def match(cls, segments, match_depth=0, parse_depth=0, verbosity=0):
         """ NamedSegment implements it's own matching function,
@@ -115,13 +122,14 @@ class NamedSegment(KeywordSegment):
                 n = s.name.upper()
             else:
                 n = s.name
-            logging.debug("[PD:{0} MD:{1}] (KW) {2}.match considering {3!r} against {4!r}".format(
-                parse_depth, match_depth, cls.__name__, n, cls._template))
+            logging.debug(
+                "[PD:%s MD:%s] (KW) %s.match considering %r against %r",
+                parse_depth, match_depth, cls.__name__, n, cls._template)
             if cls._template == n:
                 m = cls(raw=s.raw, pos_marker=segments[0].pos_marker),  # Return a tuple
                 return MatchResult(m, segments[1:])
         else:
-            logging.debug("{1} will not match sequence of length {0}".format(len(segments), cls.__name__))
+            logging.debug("%s will not match sequence of length %s", cls.__name__, len(segments))
         return MatchResult.from_unmatched(segments)
 
     @classmethod
@@ -6,7 +6,7 @@ import logging
 from sqlfluff.parser_2.grammar import (OneOf, Sequence, GreedyUntil, ContainsOnly,
                                        Delimited)
 from sqlfluff.parser_2.markers import FilePositionMarker
-from sqlfluff.parser_2.segments_base import RawSegment
+from sqlfluff.parser_2.segments_base import RawSegment, BaseSegment
 from sqlfluff.parser_2.segments_core import (KeywordSegment)
 
 # NB: All of these tests depend somewhat on the KeywordSegment working as planned
@@ -102,6 +102,56 @@ def test__parser_2__grammar_sequence_nested(seg_list, caplog):
         )
 
 
+def test__parser_2__grammar_sequence_compiled(seg_list):
+    """ Check that compiled sequences match just like the originals """
+    fs = KeywordSegment.make('foo')
+    bs = KeywordSegment.make('bar')
+    bas = KeywordSegment.make('baar')
+    grammars = [
+        Sequence(bs, fs),
+        Sequence(bs, fs, code_only=False),
+        Sequence(bs, fs.as_optional(), bas),
+        Sequence(bs, bas.as_optional()),
+        Sequence(Sequence(bs, fs), bas, fs.as_optional()),
+        # Case sensitive keywords are compiled too
+        Sequence(KeywordSegment.make('bar', case_sensitive=True), fs),
+        Sequence(KeywordSegment.make('BAR', case_sensitive=True), fs),
+        # Mixing keywords and other grammars
+        Sequence(OneOf(fs, bs), fs, GreedyUntil(bs)),
+    ]
+    for g in grammars:
+        compiled = g.compile_match()
+        # Compiling is only done once for each grammar
+        assert g.compile_match() is compiled
+        for segs in [seg_list, seg_list[:2], seg_list[:3], seg_list[1:], ()]:
+            assert compiled(segs) == g.match(segs)
+
+    # Subclasses which override match aren't compiled
+    class OtherSequence(Sequence):
+        def match(self, segments, match_depth=0, parse_depth=0, verbosity=0):
+            return super(OtherSequence, self).match(segments, match_depth, parse_depth, verbosity)
+
+    assert OtherSequence(bs, fs).compile_match() is None
+
+
+def test__parser_2__grammar_sequence_compiled_verbose(seg_list, capsys):
+    """ Check that segments don't use the compiled sequence when logging """
+    fs = KeywordSegment.make('foo')
+    bs = KeywordSegment.make('bar')
+
+    class SequenceSegment(BaseSegment):
+        type = 'sequence'
+        match_grammar = Sequence(bs, fs)
+
+    assert SequenceSegment._compiled_match
+    m = SequenceSegment.match(seg_list, verbosity=5)
+    assert m.matched_segments[0].raw == 'bar \t foo'
+    # We should get the logging from the grammar and the keywords
+    out = capsys.readouterr().out
+    assert 'Sequence._match IN' in out
+    assert 'BAR_KeywordSegment._match IN' in out
+
+
 def test__parser_2__grammar_delimited(caplog):
     seg_list = generate_test_segments(['bar', ' \t ', ',', '    ', 'bar', '    '])
     bs = KeywordSegment.make('bar')
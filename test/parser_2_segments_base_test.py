@@ -1,9 +1,16 @@
 """ The Test file for The New Parser (Base Segment Classes) """
 
+import logging
+
 import pytest
 
 from sqlfluff.parser_2.markers import FilePositionMarker
-from sqlfluff.parser_2.segments_base import RawSegment, BaseSegment
+from sqlfluff.parser_2.segments_base import (RawSegment, BaseSegment, UnparsableSegment,
+                                             check_still_complete, clear_match_cache,
+                                             verbosity_logger, verbosity_enabled)
+from sqlfluff.parser_2.segments_common import KeywordSegment
+from sqlfluff.parser_2.grammar import GreedyUntil
+from sqlfluff.parser_2.match import MatchResult
 
 
 @pytest.fixture(scope="module")
@@ -43,8 +50,10 @@ def test__parser_2__base_segments_raw_init():
 
 def test__parser_2__base_segments_raw(raw_seg):
     # Check Segment Return
-    assert raw_seg.segments == []
+    assert raw_seg.segments == ()
     assert raw_seg.raw == 'foobar'
+    assert raw_seg.is_raw()
+    assert not raw_seg.is_expandable
     # Check Formatting and Stringification
     assert str(raw_seg) == repr(raw_seg) == "<RawSegment: ([3](1, 1, 4)) 'foobar'>"
     assert (raw_seg.stringify(ident=1, tabsize=2, pos_idx=20, raw_idx=35)
@@ -59,6 +68,9 @@ def test__parser_2__base_segments_base(raw_seg_list):
     base_seg = DummySegment(raw_seg_list)
     # Check we assume the position correctly
     assert base_seg.pos_marker == raw_seg_list[0].pos_marker
+    # With no grammar, we can't expand
+    assert not base_seg.is_raw()
+    assert not base_seg.is_expandable
     # Expand and given we don't have a grammar we should get the same thing
     assert base_seg.parse() == base_seg
     # Check that we correctly reconstruct the raw
@@ -101,3 +113,177 @@ def test__parser_2__base_segments_base_compare():
     assert ds1 == ds2
     # Check a different match on the same details are not the same
     assert ds1 != dsa2
+    # Check that the position and structure matter too
+    rs3 = RawSegment('foo', fp1)
+    rs4 = RawSegment('bar', fp1.advance_by('foo'))
+    assert DummySegment([rs1]) != DummySegment([rs3, rs4])
+    assert DummySegment([rs4]) != DummySegment([RawSegment('bar', fp1)])
+
+
+def test__parser_2__base_segments_memoize(raw_seg_list):
+    """ Test that memoized segments reuse match results for the same segments """
+    class MemoSegment(BaseSegment):
+        type = 'memo'
+        memoize = True
+        match_grammar = GreedyUntil(KeywordSegment.make('foo'))
+
+    segs = tuple(raw_seg_list)
+    clear_match_cache()
+    m1 = MemoSegment._match(segs)
+    # Matching the same tuple again gives back the identical result
+    assert MemoSegment._match(segs) is m1
+    # An equal, but different, tuple doesn't hit the cache
+    assert MemoSegment._match(tuple(raw_seg_list)) is not m1
+    # Clearing the cache means we match afresh
+    clear_match_cache()
+    assert MemoSegment._match(segs) is not m1
+
+
+def test__parser_2__base_segments_resolved_grammars():
+    """ Test that grammars are resolved when classes are created """
+    g = GreedyUntil(KeywordSegment.make('foo'))
+    pg = GreedyUntil(KeywordSegment.make('bar'))
+
+    class GrammarSegment(BaseSegment):
+        grammar = g
+
+    class ParseGrammarSegment(GrammarSegment):
+        parse_grammar = pg
+
+    assert GrammarSegment._match_grammar() is g
+    assert GrammarSegment._parse_grammar() is g
+    assert ParseGrammarSegment._match_grammar() is g
+    assert ParseGrammarSegment._parse_grammar() is pg
+    # Generated classes are resolved too
+    assert ParseGrammarSegment.as_optional()._parse_grammar() is pg
+    assert DummySegment._match_grammar() is None
+
+
+def test__parser_2__base_segments_check_still_complete(raw_seg_list):
+    """ Test that we detect dropped segments """
+    segs = tuple(raw_seg_list)
+    # Nothing dropped
+    check_still_complete(segs, segs[:1], segs[1:])
+    check_still_complete(segs, (DummySegment(raw_seg_list),), ())
+    # Something dropped
+    with pytest.raises(RuntimeError):
+        check_still_complete(segs, segs[:1], ())
+    # Even when the tail is passed back untouched
+    with pytest.raises(RuntimeError):
+        check_still_complete(segs, (), segs[1:])
+
+
+def test__parser_2__base_segments_stringify_comments(raw_seg_list):
+    """ Test that comments are shown seperately for unparsable segments """
+    CommentSegment = RawSegment.make('--', name='comment', type='comment')
+    comment = CommentSegment('--', raw_seg_list[0].pos_marker)
+    unparsable = UnparsableSegment([comment] + raw_seg_list, expected="foo")
+    assert (unparsable.stringify(ident=0, tabsize=2, pos_idx=20, raw_idx=35)
+            == ("UnparsableSegment:  [3](1, 1, 4)   !! Expected: 'foo'\n"
+                "  Comments:\n"
+                "    comment_RawSegment:[3](1, 1, 4)'--'\n"
+                "  Code:\n"
+                "    RawSegment:     [3](1, 1, 4)   'foobar'\n"
+                "    RawSegment:     [9](1, 1, 10)  '.barfoo'\n"))
+    assert unparsable.type_set() == {'unparsable', 'comment', 'raw'}
+
+
+def test__parser_2__base_segments_apply_fixes(raw_seg_list):
+    """ Test that deletions and edits are applied to the right segments """
+    base_seg = DummySegment(raw_seg_list)
+    # Delete the first segment
+    fixed, remaining = base_seg.apply_fixes({'delete': [raw_seg_list[0]]})
+    assert fixed.raw == ".barfoo"
+    assert remaining == {}
+    # Segments which aren't the same object aren't touched
+    fp = FilePositionMarker.from_fresh().advance_by('abc')
+    fixed, remaining = base_seg.apply_fixes({'delete': [RawSegment('foobar', fp)]})
+    assert fixed.raw == "foobar.barfoo"
+    assert len(remaining['delete']) == 1
+    # Edit the second segment
+    edit = RawSegment('.foo', raw_seg_list[1].pos_marker)
+    fixed, remaining = base_seg.apply_fixes({'edit': [(raw_seg_list[1], edit)]})
+    assert fixed.raw == "foobar.foo"
+    assert remaining == {}
+    # Create a segment before the second one, and check positions are realigned
+    new = RawSegment(' ', raw_seg_list[1].pos_marker)
+    fixed, remaining = base_seg.apply_fixes({'create': [(raw_seg_list[1], new)]})
+    assert fixed.raw == "foobar .barfoo"
+    assert fixed.segments[2].pos_marker == raw_seg_list[1].pos_marker.advance_by(' ')
+    assert remaining == {}
+    # All at once, and nested
+    nested_seg = DummyAuxSegment([base_seg])
+    fixed, remaining = nested_seg.apply_fixes({
+        'delete': [raw_seg_list[0]],
+        'create': [(raw_seg_list[1], new)],
+        'edit': [(raw_seg_list[1], edit)]})
+    assert fixed.raw == " .foo"
+    assert fixed.to_tuple() == ('dummy_aux', (('dummy', (('raw', ()), ('raw', ()))),))
+    assert remaining == {}
+
+
+def test__parser_2__base_segments_raw_interned():
+    """ Test that the raw of raw segments is interned """
+    fp = FilePositionMarker.from_fresh()
+    rs1 = RawSegment(''.join(['foo', 'bar']), fp)
+    rs2 = RawSegment(''.join(['foob', 'ar']), fp)
+    assert rs1.raw is rs2.raw
+
+
+def test__parser_2__base_segments_verbosity_logger(capsys, caplog):
+    """ Test that messages are only formatted when they're shown """
+    class Explosive(object):
+        def __str__(self):
+            raise RuntimeError("Shouldn't have been formatted!")
+
+    # Not verbose enough, and not logging
+    with caplog.at_level(logging.WARNING):
+        assert not verbosity_enabled(verbosity=0)
+        verbosity_logger("foo %s", verbosity=0, args=(Explosive(),))
+    # Verbose enough to print
+    verbosity_logger("foo %s %s", verbosity=3, args=('bar', 1))
+    assert capsys.readouterr().out == "foo bar 1\n"
+    # Messages without args aren't formatted
+    verbosity_logger("100%", verbosity=3)
+    assert capsys.readouterr().out == "100%\n"
+    # Logging at the right level
+    with caplog.at_level(logging.INFO):
+        assert verbosity_enabled(verbosity=0)
+        verbosity_logger("foo %s", verbosity=0, args=('baz',))
+    assert "foo baz" in caplog.text
+
+
+def test__parser_2__base_segments_slots(raw_seg, raw_seg_list):
+    """ Test that the core segments don't carry a __dict__ """
+    assert not hasattr(raw_seg, '__dict__')
+    assert not hasattr(UnparsableSegment(raw_seg_list), '__dict__')
+    # Including generated classes
+    kw = KeywordSegment.make('foobar').as_optional()
+    assert not hasattr(kw('foobar', raw_seg.pos_marker), '__dict__')
+
+
+def test__parser_2__base_segments_init_types(raw_seg_list):
+    """ Test the types we can construct a segment from """
+    segs = tuple(raw_seg_list)
+    for arg in [segs, raw_seg_list, MatchResult(segs, ())]:
+        seg = DummySegment(arg)
+        assert seg.segments == segs
+        assert seg.pos_marker == raw_seg_list[0].pos_marker
+    with pytest.raises(TypeError):
+        DummySegment('foo')
+
+
+def test__parser_2__base_segments_raw_walks(raw_seg_list):
+    """ Test walking the raw segments of a nested tree """
+    nested_seg = DummyAuxSegment([DummySegment(raw_seg_list[:1]), DummySegment(raw_seg_list[1:])])
+    assert list(nested_seg.iter_raw_seg()) == raw_seg_list
+    assert nested_seg.raw_list() == ['foobar', '.barfoo']
+
+
+def test__parser_2__base_segments_match_status(raw_seg_list):
+    """ Test the status of match results """
+    segs = tuple(raw_seg_list)
+    assert MatchResult.from_unmatched(segs).status == MatchResult.NO_MATCH
+    assert MatchResult.from_empty().status == MatchResult.NO_MATCH
+    assert MatchResult(segs[:1], segs[1:]).status == MatchResult.PARTIAL
+    assert MatchResult.from_matched(segs).status == MatchResult.COMPLETE
@@ -189,3 +189,24 @@ def test__parser_2__base_parse_struct(raw, res, caplog):
     with caplog.at_level(logging.DEBUG):
         parsed = fs.parse()
     assert parsed.to_tuple(code_only=True, show_raw=True) == res
+
+
+def test__parser_2__base_parse_recurse_limit():
+    """ Check that an integer recurse limits how far down we parse """
+    parsed = FileSegment.from_raw("select 1").parse(recurse=2)
+    assert parsed.to_tuple(code_only=True) == (
+        'file', (('statement', (('select_statement', (
+            ('keyword', ()),
+            ('raw', ())
+        )),)),))
+
+
+def test__parser_2__base_parse_type_set_after_child_parse():
+    """ Check the type set reflects children which were parsed later """
+    parsed = FileSegment.from_raw("select a from b").parse(recurse=2)
+    assert 'unparsable' not in parsed.type_set()
+    # Parsing the children directly changes what the file contains
+    for seg in parsed.segments:
+        if not seg.is_raw():
+            seg.parse()
+    assert 'unparsable' in parsed.type_set()